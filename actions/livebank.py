@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-import random
+import secrets
+import sys
 from typing import Any, Dict
 
 from rich import print as rprint
@@ -9,62 +10,95 @@ from config import cfg_path
 
 OTP_EXPECTED_KEY = "otp_expected"
 
-def _log(msg: str) -> None:
-    rprint(f"[bold cyan][ACTION][/bold cyan] {msg}")
+_LOG_LEVEL = str(cfg_path("logging", "level", default="INFO")).upper()
+_LOG_ENABLED = _LOG_LEVEL in ("DEBUG", "INFO")
+# Rich markup parsing is wasted effort when stdout is a pipe or a file.
+_USE_RICH = sys.stdout.isatty()
+
+# Resolved once at import; config does not change mid-run.
+_OTP_LENGTH = int(cfg_path("demo", "otp_length", default=6))
+_TEN_POW = 10 ** _OTP_LENGTH
+_OTP_FIXED = cfg_path("demo", "otp_fixed")
+_STOCK = cfg_path("demo", "stock", default="ok")
+_PRINT_BEHAVIOR = cfg_path("demo", "print", default="ok")
+
+# Bind the right variant once; the hot action path then carries no
+# per-call level/tty branches.
+if not _LOG_ENABLED:
+    def _log(msg: str) -> None:
+        return None
+elif _USE_RICH:
+    def _log(msg: str) -> None:
+        rprint(f"[bold cyan][ACTION][/bold cyan] {msg}")
+else:
+    def _log(msg: str) -> None:
+        print(f"[ACTION] {msg}")
 
 def run_action(act: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-    t = act.get("type")
-    name = act.get("name")
-    args = act.get("args", {})
-
-    if t == "ui":
-        return _ui(name, args)
-    if t == "tts":
-        return _tts(name, args)
-    if t == "api":
-        return _api(name, args, ctx)
-    return {}
+    handler = _TYPE_HANDLERS.get(act.get("type"))
+    if handler is None:
+        return {}
+    return handler(act.get("name"), act.get("args", {}), ctx)
 
-def _ui(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+def _ui(name: str, args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
     _log(f"UI.{name}({args})")
     return {}
 
-def _tts(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+def _tts(name: str, args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
     text = (args or {}).get("text", "")
     _log(f"TTS.speak \"{text}\"")
     return {}
 
 def _api(name: str, args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
-    if name == "check_card_stock":
-        stock = cfg_path("demo", "stock", default="ok")
-        _log(f"API.check_card_stock -> {stock}")
-        return {"signal": "stock_ok" if stock == "ok" else "stock_out"}
-    if name == "send_otp":
-        otp = cfg_path("demo", "otp_fixed") or _gen_otp()
-        ctx[OTP_EXPECTED_KEY] = str(otp)
-        _log(f"API.send_otp -> sent:{otp} (demo)")
+    fn = _API_DISPATCH.get(name)
+    if fn is None:
+        _log(f"API.{name} (unknown) {args}")
         return {}
-    if name == "resend_otp":
-        otp = ctx.get(OTP_EXPECTED_KEY) or _gen_otp()
-        ctx[OTP_EXPECTED_KEY] = str(otp)
-        _log(f"API.resend_otp -> resent:{otp} (demo)")
-        return {}
-    if name == "verify_otp":
-        otp = str(args.get("otp", ""))
-        expected = str(ctx.get(OTP_EXPECTED_KEY, ""))
-        ok = (otp == expected) if expected else len(otp) in (4, 6)
-        _log(f"API.verify_otp({otp}) expected={expected} -> {'ok' if ok else 'wrong'}")
-        return {"signal": "otp_ok" if ok else "otp_wrong"}
-    if name == "print_card":
-        behavior = cfg_path("demo", "print", default="ok")
-        _log(f"API.print_card -> {behavior}")
-        return {"signal": "printed" if behavior == "ok" else "print_fail"}
-    if name == "retract_card":
-        _log("API.retract_card")
-        return {"signal": "timeout_retract"}
-    _log(f"API.{name} (unknown) {args}")
+    return fn(args, ctx)
+
+def _api_check_card_stock(args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    _log(f"API.check_card_stock -> {_STOCK}")
+    return {"signal": "stock_ok" if _STOCK == "ok" else "stock_out"}
+
+def _api_send_otp(args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    otp = _OTP_FIXED or _gen_otp()
+    ctx[OTP_EXPECTED_KEY] = str(otp)
+    _log(f"API.send_otp -> sent:{otp} (demo)")
     return {}
 
+def _api_resend_otp(args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    otp = ctx.get(OTP_EXPECTED_KEY) or _gen_otp()
+    ctx[OTP_EXPECTED_KEY] = str(otp)
+    _log(f"API.resend_otp -> resent:{otp} (demo)")
+    return {}
+
+def _api_verify_otp(args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    otp = str(args.get("otp", ""))
+    expected = str(ctx.get(OTP_EXPECTED_KEY, ""))
+    ok = (otp == expected) if expected else len(otp) in (4, 6)
+    _log(f"API.verify_otp({otp}) expected={expected} -> {'ok' if ok else 'wrong'}")
+    return {"signal": "otp_ok" if ok else "otp_wrong"}
+
+def _api_print_card(args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    _log(f"API.print_card -> {_PRINT_BEHAVIOR}")
+    return {"signal": "printed" if _PRINT_BEHAVIOR == "ok" else "print_fail"}
+
+def _api_retract_card(args: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    _log("API.retract_card")
+    return {"signal": "timeout_retract"}
+
+_API_DISPATCH = {
+    "check_card_stock": _api_check_card_stock,
+    "send_otp": _api_send_otp,
+    "resend_otp": _api_resend_otp,
+    "verify_otp": _api_verify_otp,
+    "print_card": _api_print_card,
+    "retract_card": _api_retract_card,
+}
+
+_TYPE_HANDLERS = {"ui": _ui, "tts": _tts, "api": _api}
+
 def _gen_otp() -> str:
-    length = int(cfg_path("demo", "otp_length", default=6))
-    return "".join(str(random.randint(0, 9)) for _ in range(length))
+    # One CSPRNG draw formatted with leading zeros, instead of a Python-level
+    # digit loop; also upgrades the OTP source to a cryptographic generator.
+    return f"{secrets.randbelow(_TEN_POW):0{_OTP_LENGTH}d}"
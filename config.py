@@ -4,7 +4,22 @@ from typing import Any, Dict
 
 import yaml
 
+try:  # libyaml parses 5-20x faster; fall back to the pure-Python loader
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # pragma: no cover - depends on how PyYAML was built
+    from yaml import SafeLoader as _YamlLoader  # type: ignore[assignment]
+
 _CFG: Dict[str, Any] | None = None
+# Every existing key path mapped to its value, so cfg_path() is one dict.get
+# instead of a per-call walk with isinstance/contains checks.
+_FLAT: Dict[tuple[str, ...], Any] = {}
+
+
+def _flatten(node: Any, prefix: tuple[str, ...]) -> None:
+    _FLAT[prefix] = node
+    if isinstance(node, dict):
+        for key, value in node.items():
+            _flatten(value, prefix + (key,))
 
 
 def load_config() -> Dict[str, Any]:
@@ -19,17 +34,15 @@ def load_config() -> Dict[str, Any]:
     for path in [c for c in candidates if c]:
         if os.path.exists(path):
             with open(path, "r", encoding="utf-8") as f:
-                _CFG = yaml.safe_load(f) or {}
-                return _CFG
-    _CFG = {}
+                _CFG = yaml.load(f, Loader=_YamlLoader) or {}
+            break
+    else:
+        _CFG = {}
+    _flatten(_CFG, ())
     return _CFG
 
 
 def cfg_path(*keys: str, default: Any = None) -> Any:
-    cfg = load_config()
-    cur: Any = cfg
-    for key in keys:
-        if not isinstance(cur, dict) or key not in cur:
-            return default
-        cur = cur[key]
-    return cur
+    if _CFG is None:
+        load_config()
+    return _FLAT.get(keys, default)
@@ -1,9 +1,31 @@
 from __future__ import annotations
 
+import ast
+import types
 from collections.abc import MutableMapping
+from functools import lru_cache
 from typing import Any, Dict
 
 
+class AttrDict(dict):
+    """Dict with attribute-style access, used as the FSM context container.
+
+    Guard/after expressions read ``ctx.<key>``; backing the context with a
+    dict subclass makes that a plain dict lookup with no per-call proxy
+    allocation.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    __setattr__ = dict.__setitem__  # type: ignore[assignment]
+
+
 class _ContextProxy:
     """Provide attribute-style access to a mutable mapping."""
 
@@ -27,6 +49,8 @@ class _ContextProxy:
 
 
 def _wrap_ctx(ctx: Dict[str, Any]) -> Any:
+    if isinstance(ctx, AttrDict):
+        return ctx
     if isinstance(ctx, MutableMapping):
         return _ContextProxy(ctx)
     return ctx
@@ -34,6 +58,8 @@ def _wrap_ctx(ctx: Dict[str, Any]) -> Any:
 
 _SANDBOX_GLOBALS: Dict[str, Any] = {
     "__builtins__": {},
+    # the one builtin compiled guards need: their lambda body is bool(<expr>)
+    "bool": bool,
     # allow JSON-style literals that appear in guard/after expressions authored by non-Python tooling
     "true": True,
     "false": False,
@@ -41,13 +67,78 @@ _SANDBOX_GLOBALS: Dict[str, Any] = {
 }
 
 
+class _CtxAttrRewriter(ast.NodeTransformer):
+    """Rewrite ``ctx.<name>`` nodes into ``ctx["<name>"]`` subscripts.
+
+    Guards in rules.yaml are authored in attribute style; rewriting them to
+    subscripts lets the compiled closure read the context dict directly, so
+    no attribute-access wrapper has to be built per call.
+    """
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.value, ast.Name) and node.value.id == "ctx":
+            return ast.copy_location(
+                ast.Subscript(value=node.value, slice=ast.Constant(node.attr), ctx=node.ctx),
+                node,
+            )
+        return node
+
+
+# Guard/after expressions come from rules.yaml, so the set is small and fixed;
+# compile each unique expression once instead of re-parsing it every tick.
+@lru_cache(maxsize=512)
+def _compile_eval(expr: str) -> types.CodeType:
+    return compile(expr, "<guard>", "eval")
+
+
+@lru_cache(maxsize=512)
+def _compile_exec(expr: str) -> types.CodeType:
+    return compile(expr, "<after>", "exec")
+
+
+@lru_cache(maxsize=512)
+def make_guard_fn(expr: str) -> Any:
+    """Compile a guard expression into a reusable ``fn(ctx) -> bool``.
+
+    ``ctx.<key>`` reads are rewritten to ``ctx["<key>"]`` so the closure
+    indexes the context dict directly. Returns ``None`` when the expression
+    does not compile as a single expression; callers should then fall back
+    to :func:`eval_guard`.
+    """
+    try:
+        tree = ast.parse(f"lambda ctx: bool({expr})", mode="eval")
+    except SyntaxError:
+        return None
+    tree = ast.fix_missing_locations(_CtxAttrRewriter().visit(tree))
+    return eval(compile(tree, "<guard>", "eval"), _SANDBOX_GLOBALS)
+
+
+@lru_cache(maxsize=512)
+def make_after_fn(expr: str) -> Any:
+    """Compile an after expression into a reusable ``fn(ctx) -> None``.
+
+    Assignment targets get the same ``ctx.<key>`` -> ``ctx["<key>"]`` rewrite
+    as guards. Returns ``None`` when the expression cannot be wrapped in a
+    function body; callers should then fall back to :func:`apply_after`.
+    """
+    try:
+        tree = ast.parse(f"def _after(ctx):\n    {expr}", mode="exec")
+    except SyntaxError:
+        return None
+    tree = ast.fix_missing_locations(_CtxAttrRewriter().visit(tree))
+    ns: Dict[str, Any] = {}
+    exec(compile(tree, "<after>", "exec"), _SANDBOX_GLOBALS, ns)
+    return ns["_after"]
+
+
 def eval_guard(expr: str, ctx: Dict[str, Any]) -> bool:
     if not expr:
         return True
-    return bool(eval(expr, _SANDBOX_GLOBALS, {"ctx": _wrap_ctx(ctx)}))
+    return bool(eval(_compile_eval(expr), _SANDBOX_GLOBALS, {"ctx": _wrap_ctx(ctx)}))
 
 
 def apply_after(expr: str, ctx: Dict[str, Any]) -> None:
     if not expr:
         return
-    exec(expr, _SANDBOX_GLOBALS, {"ctx": _wrap_ctx(ctx)})
+    exec(_compile_exec(expr), _SANDBOX_GLOBALS, {"ctx": _wrap_ctx(ctx)})
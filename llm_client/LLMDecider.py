@@ -1,21 +1,113 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import queue
 import re
-from typing import Any, Dict, List, Optional
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence
 
 import requests
-from jsonschema import validate
+from jsonschema import Draft7Validator
+from requests.adapters import HTTPAdapter
 from jsonschema.exceptions import ValidationError
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 from config import cfg_path
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, stdlib fallback below
+    orjson = None  # type: ignore[assignment]
+
+
+def _dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _loads(text: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+@lru_cache(maxsize=64)
+def _allowed_set(allowed: tuple[str, ...]) -> frozenset[str]:
+    return frozenset(allowed)
+
+
+_DECISION_CACHE_MAX = 1024
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL | re.IGNORECASE)
+
+
+def _scan_json_object(text: str) -> Optional[str]:
+    """Return the first balanced ``{...}`` block, honoring string literals.
+
+    A single forward pass tracking brace depth and escapes; no regex
+    backtracking over multi-KB responses.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    in_str = False
+    esc = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return None
+
+
+def _canonical(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _invalid_output(error: str) -> Dict[str, Any]:
+    return {
+        "intent": "cancel",
+        "params": {},
+        "response": {"type": "text", "content": "Xin lỗi, đầu ra không hợp lệ."},
+        "meta": {"error": error},
+    }
+
 
 class DecisionError(Exception):
     """Raised when the LLM output cannot be parsed into a decision."""
 
 
+class _BatchItem:
+    """One in-flight prompt awaiting its slice of a batched response."""
+
+    __slots__ = ("prompt", "event", "result", "error")
+
+    def __init__(self, prompt: str) -> None:
+        self.prompt = prompt
+        self.event = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
 class LLMDecider:
     """Calls internal LLM over HTTP and enforces Decision JSON schema."""
 
@@ -24,8 +116,34 @@ class LLMDecider:
         self.timeout = cfg_path("llm", "timeout_sec", default=12)
         self.strict = bool(cfg_path("llm", "strict", default=True))
         self.trace = bool(cfg_path("trace", "enabled", default=False))
+        self.cache_enabled = bool(cfg_path("llm", "cache", default=False))
+        self.batch_enabled = bool(cfg_path("llm", "batch", "enabled", default=False))
+        self.batch_max_size = int(cfg_path("llm", "batch", "max_size", default=8))
+        self.batch_max_wait = float(cfg_path("llm", "batch", "max_wait_ms", default=10)) / 1000.0
+        self._batch_queue: Optional[queue.Queue[_BatchItem]] = None
+        self._batch_lock = threading.Lock()
+        # Flips to False once the backend rejects the batched payload shape.
+        self._batch_supported = True
+        # Static prompt parts (system, instructions, examples, base context)
+        # per state; prompt configs are load-once, so only the dynamic fields
+        # need rebuilding on each decide().
+        self._static_parts: Dict[str, tuple[Any, ...]] = {}
+        # Serialized invariant head of the prompt JSON per state; decide()
+        # splices the per-call context and utterance onto it instead of
+        # re-encoding system/instructions/examples every time.
+        self._prefix_cache: Dict[str, tuple[Any, tuple[str, ...], str]] = {}
+        # LRU of canonical-JSON decisions keyed by a content hash of the
+        # prompt inputs; opt-in via llm.cache since it trades freshness
+        # for latency on repeated utterances.
+        self._cache: OrderedDict[bytes, str] = OrderedDict()
         if not self.url:
             raise RuntimeError("Missing llm.url in config.yml")
+        # Keep-alive session so repeated decide() calls reuse pooled
+        # connections instead of paying a TCP handshake per request.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
         self.schema = {
             "type": "object",
             "required": ["intent", "params", "response"],
@@ -45,38 +163,219 @@ class LLMDecider:
             },
             "additionalProperties": True,
         }
+        # Build the validator once; jsonschema.validate() would recompile the
+        # schema on every decision.
+        self._validator = Draft7Validator(self.schema)
+
+    def close(self) -> None:
+        """Release the pooled keep-alive connections held by the session."""
+        self._session.close()
 
     def _extract_json(self, text: str) -> Dict[str, Any]:
-        fence = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL | re.IGNORECASE)
+        # Fast path: a well-behaved model returns bare JSON, no regex needed.
+        stripped = text.strip()
+        if stripped.startswith("{"):
+            try:
+                return _loads(stripped)
+            except ValueError:
+                pass
+        fence = _FENCE_RE.search(text)
         if fence:
-            return json.loads(fence.group(1))
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if not match:
+            return _loads(fence.group(1))
+        block = _scan_json_object(text)
+        if block is None:
             raise DecisionError("No JSON found in LLM response")
-        return json.loads(match.group(0))
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type((requests.RequestException,)),
-    )
+        return _loads(block)
+
+    def _cache_key(
+        self,
+        state: str,
+        allowed_intents: Sequence[str],
+        context: Dict[str, Any],
+        payload: Any,
+    ) -> bytes:
+        digest = hashlib.sha256()
+        parts = (state, ",".join(sorted(allowed_intents)), _canonical(context), _canonical(payload))
+        for part in parts:
+            raw = part.encode("utf-8")
+            # Length-prefix each component so concatenations cannot collide.
+            digest.update(struct.pack(">Q", len(raw)))
+            digest.update(raw)
+        return digest.digest()
+
+    def _cache_get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        raw = self._cache.get(key)
+        if raw is None:
+            return None
+        decision = _loads(raw)
+        if self.strict:
+            try:
+                self._validator.validate(decision)
+            except ValidationError:
+                self._cache.pop(key, None)
+                return None
+        self._cache.move_to_end(key)
+        if self.trace:
+            print("[TRACE LLM] Decision cache hit")
+        return decision
+
+    def _cache_put(self, key: bytes, decision: Dict[str, Any]) -> None:
+        self._cache[key] = _dumps(decision)
+        self._cache.move_to_end(key)
+        while len(self._cache) > _DECISION_CACHE_MAX:
+            self._cache.popitem(last=False)
+
     def _post_llm(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        response = requests.post(self.url, json=payload, timeout=self.timeout)
-        response.raise_for_status()
-        return response.json()
+        # Plain retry loop (3 attempts, exponential backoff capped at 4s);
+        # avoids tenacity's per-call decorator machinery on the happy path.
+        delay = 0.5
+        for attempt in range(3):
+            try:
+                response = self._session.post(self.url, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException:
+                if attempt == 2:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 4.0)
+        raise requests.RequestException("unreachable")  # pragma: no cover
+
+    def _query_llm(self, prompt: str) -> Dict[str, Any]:
+        if self.batch_enabled and self._batch_supported:
+            return self._submit_batched(prompt)
+        return self._post_llm({"query": prompt})
+
+    def _submit_batched(self, prompt: str) -> Dict[str, Any]:
+        if self._batch_queue is None:
+            with self._batch_lock:
+                if self._batch_queue is None:
+                    self._batch_queue = queue.Queue()
+                    threading.Thread(
+                        target=self._batch_worker, name="llm-batcher", daemon=True
+                    ).start()
+        item = _BatchItem(prompt)
+        self._batch_queue.put(item)
+        # Leave headroom over the per-request timeout (batch post + fallback).
+        wait_secs = (float(self.timeout) if self.timeout else 12.0) * 4 + 1.0
+        if not item.event.wait(wait_secs):
+            raise requests.RequestException("Timed out waiting for batched LLM response")
+        if item.error is not None:
+            raise item.error
+        return item.result or {}
+
+    def _batch_worker(self) -> None:
+        q = self._batch_queue
+        assert q is not None
+        while True:
+            batch = [q.get()]
+            # Coalesce whatever lands within the collection window.
+            deadline = time.monotonic() + self.batch_max_wait
+            while len(batch) < self.batch_max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch: list[_BatchItem]) -> None:
+        if len(batch) > 1 and self._batch_supported:
+            try:
+                data = self._post_llm({"queries": [item.prompt for item in batch]})
+                answers = data.get("responses") if isinstance(data, dict) else data
+                if isinstance(answers, list) and len(answers) == len(batch):
+                    for item, answer in zip(batch, answers):
+                        item.result = answer if isinstance(answer, dict) else {"response": answer}
+                        item.event.set()
+                    return
+                # Unexpected response shape: stop batching and re-post singly.
+                self._batch_supported = False
+            except requests.HTTPError as exc:
+                if exc.response is not None and exc.response.status_code == 400:
+                    self._batch_supported = False
+                else:
+                    for item in batch:
+                        item.error = exc
+                        item.event.set()
+                    return
+            except Exception as exc:
+                for item in batch:
+                    item.error = exc
+                    item.event.set()
+                return
+        for item in batch:
+            try:
+                item.result = self._post_llm({"query": item.prompt})
+            except Exception as exc:
+                item.error = exc
+            item.event.set()
+
+    def _static_prompt_parts(
+        self, state: str, prompt_cfg: Dict[str, Any]
+    ) -> tuple[str, str, Any, Dict[str, Any]]:
+        cached = self._static_parts.get(state)
+        if cached is not None and cached[0] is prompt_cfg:
+            return cached[1]
+        base_context = dict(prompt_cfg.get("context") or {})
+        base_context.setdefault("state", state)
+        parts = (
+            (prompt_cfg.get("system") or "").strip(),
+            (prompt_cfg.get("instructions") or "").strip(),
+            prompt_cfg.get("examples"),
+            base_context,
+        )
+        self._static_parts[state] = (prompt_cfg, parts)
+        return parts
+
+    def _prompt_prefix(
+        self, state: str, allowed_intents: Sequence[str], prompt_cfg: Dict[str, Any]
+    ) -> str:
+        allowed_key = tuple(allowed_intents)
+        cached = self._prefix_cache.get(state)
+        if cached is not None and cached[0] is prompt_cfg and cached[1] == allowed_key:
+            return cached[2]
+        system, instructions, examples, _ = self._static_prompt_parts(state, prompt_cfg)
+        body: Dict[str, Any] = {
+            "system": system,
+            "state": state,
+            "allowed_intents": list(allowed_key),
+        }
+        if instructions:
+            body["instructions"] = instructions
+        if examples:
+            body["examples"] = examples
+        # Drop the closing brace; decide() appends the dynamic tail.
+        prefix = _dumps(body)[:-1]
+        self._prefix_cache[state] = (prompt_cfg, allowed_key, prefix)
+        return prefix
+
+    def _retry_with_feedback(self, prompt: str, error: ValidationError) -> Optional[Dict[str, Any]]:
+        """Re-ask once with the validation error appended to the prompt."""
+        try:
+            data = self._query_llm(f"{prompt}\nPrevious JSON failed validation: {error.message}")
+            resp_text = data.get("response", "") if isinstance(data, dict) else ""
+            retried = self._extract_json(resp_text) if isinstance(resp_text, str) else resp_text
+            if isinstance(retried, dict):
+                self._validator.validate(retried)
+                return retried
+        except Exception as exc:
+            if self.trace:
+                print("[TRACE LLM] Feedback retry failed:", exc)
+        return None
 
     def decide(
         self,
         state: str,
-        allowed_intents: List[str],
+        allowed_intents: Sequence[str],
         user_input: Dict[str, Any],
         prompt_cfg: Dict[str, Any],
         fsm_context: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        system = (prompt_cfg.get("system") or "").strip()
-        context = dict(prompt_cfg.get("context") or {})
-        context.setdefault("state", state)
+        system, instructions, examples, base_context = self._static_prompt_parts(state, prompt_cfg)
+        context = dict(base_context)
         context.setdefault("allowed_intents", allowed_intents)
 
         if fsm_context:
@@ -101,29 +400,23 @@ class LLMDecider:
         if signal:
             context["system_signal"] = signal
 
-        prompt_body: Dict[str, Any] = {
-            "system": system,
-            "context": context,
-            "state": state,
-            "allowed_intents": allowed_intents,
-            "user_utterance": payload,
-        }
-
-        instructions = (prompt_cfg.get("instructions") or "").strip()
-        if instructions:
-            prompt_body["instructions"] = instructions
-
-        examples = prompt_cfg.get("examples")
-        if examples:
-            prompt_body["examples"] = examples
+        cache_key: Optional[bytes] = None
+        if self.cache_enabled:
+            cache_key = self._cache_key(state, allowed_intents, context, payload)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
 
-        prompt = json.dumps(prompt_body, ensure_ascii=False)
+        # Only context and user_utterance vary per call; the rest of the body
+        # is spliced in from the cached per-state prefix.
+        prefix = self._prompt_prefix(state, allowed_intents, prompt_cfg)
+        prompt = f'{prefix},"context":{_dumps(context)},"user_utterance":{_dumps(payload)}}}'
 
         if self.trace:
             print("\n[TRACE LLM] POST prompt:", prompt)
 
         try:
-            data = self._post_llm({"query": prompt})
+            data = self._query_llm(prompt)
         except Exception as exc:
             if self.trace:
                 print("[TRACE LLM] HTTP error:", exc)
@@ -143,37 +436,30 @@ class LLMDecider:
         except Exception as exc:
             if self.trace:
                 print("[TRACE LLM] Parse error:", exc)
-            decision = {
-                "intent": "cancel",
-                "params": {},
-                "response": {"type": "text", "content": "Xin lỗi, đầu ra không hợp lệ."},
-                "meta": {"error": str(exc)},
-            }
+            decision = _invalid_output(str(exc))
 
         if self.strict:
             if not isinstance(decision, dict):
-                decision = {
-                    "intent": "cancel",
-                    "params": {},
-                    "response": {"type": "text", "content": "Xin lỗi, đầu ra không hợp lệ."},
-                    "meta": {"error": "non-object decision"},
-                }
+                decision = _invalid_output("non-object decision")
             else:
+                valid = True
                 try:
-                    validate(instance=decision, schema=self.schema)
+                    self._validator.validate(decision)
                 except ValidationError as exc:
                     if self.trace:
                         print("[TRACE LLM] Schema validation error:", exc)
-                    decision = {
-                        "intent": "cancel",
-                        "params": {},
-                        "response": {"type": "text", "content": "Xin lỗi, đầu ra không hợp lệ."},
-                        "meta": {"error": f"schema: {str(exc)}"},
-                    }
-                else:
+                    retried = self._retry_with_feedback(prompt, exc)
+                    if retried is not None:
+                        decision = retried
+                    else:
+                        decision = _invalid_output(f"schema: {str(exc)}")
+                        valid = False
+                if valid:
                     if "params" not in decision or not isinstance(decision.get("params"), dict):
                         decision["params"] = {}
-                    if allowed_intents and decision.get("intent") not in allowed_intents:
+                    if allowed_intents and decision.get("intent") not in _allowed_set(
+                        tuple(allowed_intents)
+                    ):
                         decision["intent"] = "cancel"
 
         response_block = decision.get("response")
@@ -186,4 +472,26 @@ class LLMDecider:
         if self.trace:
             print("[TRACE LLM] Decision:", decision)
 
+        if cache_key is not None and not (decision.get("meta") or {}).get("error"):
+            self._cache_put(cache_key, decision)
+
         return decision
+
+    async def decide_async(
+        self,
+        state: str,
+        allowed_intents: Sequence[str],
+        user_input: Dict[str, Any],
+        prompt_cfg: Dict[str, Any],
+        fsm_context: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Async wrapper around :meth:`decide`.
+
+        Offloads the blocking HTTP round-trip to a worker thread so an event
+        loop multiplexing several kiosk sessions (e.g. via ``app.ainvoke`` +
+        ``asyncio.gather``) is not stalled for the full LLM latency. The
+        pooled session is shared with the sync path.
+        """
+        return await asyncio.to_thread(
+            self.decide, state, allowed_intents, user_input, prompt_cfg, fsm_context
+        )
@@ -3,35 +3,124 @@ from __future__ import annotations
 import json
 import os
 import re
+import sys
 import time
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional
 
 from langgraph.graph import START, END, StateGraph
-from yaml import safe_load
+import yaml
+
+try:  # libyaml parses 5-20x faster; fall back to the pure-Python loader
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # pragma: no cover - depends on how PyYAML was built
+    from yaml import SafeLoader as _YamlLoader  # type: ignore[assignment]
 
 from config import cfg_path
 from llm_client.LLMDecider import LLMDecider
 from actions.livebank import run_action
-from fsm.guards import apply_after, eval_guard
+from fsm.guards import AttrDict, apply_after, eval_guard, make_after_fn, make_guard_fn
 from orchestrator.state import OrchestratorState
 from orchestrator.timeouts import check_expired, clear_timer, set_timer
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup, stdlib fallback below
+    orjson = None  # type: ignore[assignment]
+
 # Load rules
 RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "fsm", "rules.yaml")
 with open(RULES_PATH, "r", encoding="utf-8") as f:
-    RULES = safe_load(f)
+    RULES = yaml.load(f, Loader=_YamlLoader)
+
+
+# Compile guard/after expressions once at load time so decide_node calls plain
+# callables instead of going through eval()/exec() per tick.
+def _compile_transition(trans: Dict[str, Any]) -> None:
+    to = trans.get("to")
+    if isinstance(to, str):
+        trans["to"] = sys.intern(to)
+    guard = trans.get("guard")
+    if guard:
+        trans["guard_fn"] = make_guard_fn(guard)
+    after = trans.get("after")
+    if after:
+        trans["after_fn"] = make_after_fn(after)
+    fallback = trans.get("fallback")
+    if isinstance(fallback, dict):
+        _compile_transition(fallback)
+
+
+for _st_rules in RULES.get("states", {}).values():
+    for _trans in _st_rules.values():
+        if isinstance(_trans, dict):
+            _compile_transition(_trans)
+
+# Flatten the lookups decide_node/think_node repeat every tick.
+_STATE_RULES: Dict[str, Dict[str, Any]] = RULES.get("states", {})
+_ALLOWED: Dict[str, tuple[str, ...]] = {
+    st: tuple(k for k in rules if not k.startswith("_")) for st, rules in _STATE_RULES.items()
+}
+
 
-# Load prompts per state (optional)
+class _Trans(NamedTuple):
+    """A transition frozen at load time for cheap per-tick access.
+
+    Bulk replay/simulation runs tens of thousands of ticks with no network
+    I/O, where the repeated dict probes on the raw YAML records dominate;
+    attribute reads on a NamedTuple are C-level index lookups.
+    """
+
+    guard: Optional[str]
+    guard_fn: Any
+    after: Optional[str]
+    after_fn: Any
+    actions: List[Dict[str, Any]]
+    to: Optional[str]
+    fallback: Optional["_Trans"]
+
+
+def _freeze_transition(trans: Dict[str, Any]) -> _Trans:
+    fallback = trans.get("fallback")
+    return _Trans(
+        guard=trans.get("guard"),
+        guard_fn=trans.get("guard_fn"),
+        after=trans.get("after"),
+        after_fn=trans.get("after_fn"),
+        actions=trans.get("actions", []),
+        to=trans.get("to"),
+        fallback=_freeze_transition(fallback) if isinstance(fallback, dict) else None,
+    )
+
+
+# Per-state dispatch table with interned keys: one lookup resolves a signal,
+# intent or _auto transition, instead of re-probing nested RULES dicts.
+_EMPTY: Dict[str, _Trans] = {}
+_TRANS: Dict[str, Dict[str, _Trans]] = {
+    sys.intern(st): {
+        sys.intern(k): _freeze_transition(v) for k, v in rules.items() if isinstance(v, dict)
+    }
+    for st, rules in _STATE_RULES.items()
+}
+
+# Prompts per state (optional) are loaded lazily on first visit and memoized,
+# so import time no longer pays one read+parse per prompt file.
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "fsm", "prompts")
-PROMPTS: Dict[str, Dict[str, Any]] = {}
-for fname in os.listdir(PROMPTS_DIR):
-    if fname.endswith(".json"):
-        st = fname.replace(".json", "")
-        with open(os.path.join(PROMPTS_DIR, fname), "r", encoding="utf-8") as pf:
-            try:
-                PROMPTS[st] = json.load(pf)
-            except Exception:
-                PROMPTS[st] = {}
+
+
+@lru_cache(maxsize=128)
+def _load_prompt(state: str) -> Dict[str, Any]:
+    path = os.path.join(PROMPTS_DIR, f"{state}.json")
+    try:
+        with open(path, "rb") as pf:
+            raw = pf.read()
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except Exception:
+        return {}
+
+# Timeout config resolved once at load; three nodes previously re-probed the
+# nested RULES dicts for this value on every tick.
+_OTP_IDLE_SECS = int(RULES.get("timeouts", {}).get("OTP_no_input") or 0)
 
 # Single decider instance (HTTP LLM)
 DECIDER = LLMDecider()
@@ -48,24 +137,24 @@ DEVICE_DRIVEN_STATES = {
     "CARD_PICKUP",
 }
 
-def _allowed_intents(state: str) -> List[str]:
-    st_rules: Dict[str, Any] = RULES.get("states", {}).get(state, {})
-    return [k for k in st_rules.keys() if not k.startswith("_")]
-
 # --- Node 0: check timeouts ---
 def check_timeouts_node(s: OrchestratorState) -> OrchestratorState:
-    now = s.get("now") or time.time()
+    now = s.get("now") or time.monotonic()
     s["now"] = now
-    ctx = s.setdefault("ctx", {})
+    # Entry node: normalize ctx once per session; downstream nodes can then
+    # assume an AttrDict with a "timers" dict present.
+    ctx = s.get("ctx")
+    if not isinstance(ctx, AttrDict):
+        ctx = AttrDict(ctx or {})
+        ctx.setdefault("timers", {})
+        s["ctx"] = ctx
 
     if s.get("state") == "OTP":
-        timers = ctx.get("timers", {})
-        if "OTP_no_input" not in timers:
-            idle_secs = RULES.get("timeouts", {}).get("OTP_no_input")
-            if idle_secs:
-                set_timer(ctx, "OTP_no_input", int(idle_secs), now)
+        timers = ctx["timers"]
+        if "OTP_no_input" not in timers and _OTP_IDLE_SECS:
+            set_timer(ctx, "OTP_no_input", _OTP_IDLE_SECS, now)
     else:
-        if ctx.get("timers", {}).get("OTP_no_input"):
+        if ctx["timers"].get("OTP_no_input"):
             clear_timer(ctx, "OTP_no_input")
 
     expired = check_expired(ctx, now)
@@ -103,8 +192,8 @@ def think_node(s: OrchestratorState) -> OrchestratorState:
             print("[TRACE NODE think] BYPASS system signal")
         return s
 
-    allowed = _allowed_intents(st)
-    prompt_cfg = PROMPTS.get(st, {})
+    allowed = _ALLOWED.get(st, ())
+    prompt_cfg = _load_prompt(st)
     decision = DECIDER.decide(st, allowed, user_input, prompt_cfg, s.get("ctx") or {})
     s["decision"] = decision
     s["response"] = decision.get("response", {"type": "none", "content": ""})
@@ -113,8 +202,8 @@ def think_node(s: OrchestratorState) -> OrchestratorState:
 # --- Node 2: decide (FSM) ---
 def decide_node(s: OrchestratorState) -> OrchestratorState:
     st = s["state"]
-    ctx = s.setdefault("ctx", {})
-    state_rules: Dict[str, Any] = RULES.get("states", {}).get(st, {})
+    ctx = s["ctx"]
+    table: Dict[str, _Trans] = _TRANS.get(st, _EMPTY)
     signal = s.get("input", {}).get("signal")
 
     if TRACE_ENABLED:
@@ -122,47 +211,49 @@ def decide_node(s: OrchestratorState) -> OrchestratorState:
             f"[TRACE NODE decide] state={st} signal={signal} intent={s.get('decision', {}).get('intent')}"
         )
 
-    trans: Dict[str, Any] | None = None
-
-    if signal and signal in state_rules:
-        trans = state_rules.get(signal)
+    trans: Optional[_Trans] = table.get(signal) if signal else None
     if trans is None:
-        intent = s.get("decision", {}).get("intent")
-        trans = state_rules.get(intent)
+        trans = table.get(s.get("decision", {}).get("intent"))
     if trans is None:
-        trans = state_rules.get("_auto")
+        trans = table.get("_auto")
     if trans is None:
         s["actions"] = [{"type": "ui", "name": "back_home", "args": {}}]
         s["state"] = "FAILED"
         return s
 
-    guard = trans.get("guard")
-    if guard and not eval_guard(guard, ctx):
-        fallback = trans.get("fallback")
-        if fallback:
-            s["actions"] = fallback.get("actions", [])
-            s["state"] = fallback.get("to", st)
+    if trans.guard_fn is not None:
+        guard_ok = trans.guard_fn(ctx)
+    elif trans.guard:
+        guard_ok = eval_guard(trans.guard, ctx)
+    else:
+        guard_ok = True
+    if not guard_ok:
+        fallback = trans.fallback
+        if fallback is not None:
+            s["actions"] = fallback.actions
+            s["state"] = fallback.to or st
             return s
-        s["actions"] = trans.get("actions", [])
+        s["actions"] = trans.actions
         s["state"] = st
         return s
 
-    after = trans.get("after")
-    if after:
-        apply_after(after, ctx)
+    if trans.after:
+        if trans.after_fn is not None:
+            trans.after_fn(ctx)
+        else:
+            apply_after(trans.after, ctx)
 
-    s["actions"] = trans.get("actions", [])
-    next_state = trans.get("to", st)
+    s["actions"] = trans.actions
+    next_state = trans.to or st
 
     if TRACE_ENABLED:
         print(f"[TRACE NODE decide] transition={trans}")
 
     if st != next_state and next_state == "OTP":
-        idle_secs = RULES.get("timeouts", {}).get("OTP_no_input")
-        if idle_secs:
-            set_timer(ctx, "OTP_no_input", int(idle_secs), s.get("now"))
+        if _OTP_IDLE_SECS:
+            set_timer(ctx, "OTP_no_input", _OTP_IDLE_SECS, s.get("now"))
     elif st == "OTP" and next_state != "OTP":
-        if ctx.get("timers", {}).get("OTP_no_input"):
+        if ctx["timers"].get("OTP_no_input"):
             clear_timer(ctx, "OTP_no_input")
 
     s["state"] = next_state
@@ -170,8 +261,8 @@ def decide_node(s: OrchestratorState) -> OrchestratorState:
 
 # --- Node 3: run actions ---
 def run_actions_node(s: OrchestratorState) -> OrchestratorState:
-    ctx = s.setdefault("ctx", {})
-    now = s.get("now") or time.time()
+    ctx = s["ctx"]
+    now = s.get("now") or time.monotonic()
     signals: List[str] = []
     params = s.get("decision", {}).get("params") or {}
 
@@ -201,9 +292,8 @@ def run_actions_node(s: OrchestratorState) -> OrchestratorState:
         s["input"] = {"channel": "system", "signal": signals[-1]}
     else:
         if s.get("state") == "OTP" and s.get("input", {}).get("channel") == "voice":
-            idle_secs = RULES.get("timeouts", {}).get("OTP_no_input")
-            if idle_secs:
-                set_timer(ctx, "OTP_no_input", int(idle_secs), now)
+            if _OTP_IDLE_SECS:
+                set_timer(ctx, "OTP_no_input", _OTP_IDLE_SECS, now)
         s["input"] = {}
 
     return s
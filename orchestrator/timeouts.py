@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import heapq
 import time
-from typing import Any, Dict
+from itertools import count
+from typing import Any, Dict, List, Tuple
 
 from config import cfg_path
 
 TIMER_KEY = "timers"
+HEAP_KEY = "timers_heap"
 TRACE_ENABLED = bool(cfg_path("trace", "enabled", default=False))
 
+# Tie-breaker so heap entries never compare by name.
+_seq = count()
+
 def ensure_timer_ctx(ctx: Dict[str, Any]) -> Dict[str, float]:
     timers = ctx.get(TIMER_KEY)
     if timers is None:
@@ -15,25 +21,66 @@ def ensure_timer_ctx(ctx: Dict[str, Any]) -> Dict[str, float]:
         ctx[TIMER_KEY] = timers
     return timers
 
-def set_timer(ctx: Dict[str, Any], name: str, secs: int, now: float | None = None) -> None:
+def _heap(ctx: Dict[str, Any]) -> List[Tuple[float, int, str]]:
+    heap = ctx.get(HEAP_KEY)
+    if heap is None:
+        heap = []
+        ctx[HEAP_KEY] = heap
+    return heap
+
+def _set_timer(ctx: Dict[str, Any], name: str, secs: int, now: float | None = None) -> None:
     timers = ensure_timer_ctx(ctx)
     if now is None:
-        now = time.time()
-    timers[name] = now + secs
-    if TRACE_ENABLED:
-        print(f"[TRACE timer] set {name} in {secs}s -> {timers[name]:.3f}")
+        now = time.monotonic()
+    expiry = now + secs
+    timers[name] = expiry
+    heapq.heappush(_heap(ctx), (expiry, next(_seq), name))
+
+def _set_timer_traced(ctx: Dict[str, Any], name: str, secs: int, now: float | None = None) -> None:
+    _set_timer(ctx, name, secs, now)
+    print(f"[TRACE timer] set {name} in {secs}s -> {ctx[TIMER_KEY][name]:.3f}")
 
-def clear_timer(ctx: Dict[str, Any], name: str) -> None:
+def _clear_timer(ctx: Dict[str, Any], name: str) -> None:
+    # The map stays authoritative; the matching heap entry goes stale and is
+    # dropped lazily by check_expired.
     timers = ensure_timer_ctx(ctx)
     timers.pop(name, None)
-    if TRACE_ENABLED:
-        print(f"[TRACE timer] clear {name}")
 
-def check_expired(ctx: Dict[str, Any], now: float | None = None) -> str | None:
+def _clear_timer_traced(ctx: Dict[str, Any], name: str) -> None:
+    _clear_timer(ctx, name)
+    print(f"[TRACE timer] clear {name}")
+
+def _check_expired(ctx: Dict[str, Any], now: float | None = None) -> str | None:
+    heap = ctx.get(HEAP_KEY)
+    if not heap:
+        return None
     timers = ensure_timer_ctx(ctx)
+    if not timers:
+        # Nothing active: whatever is queued is stale, so drop it without
+        # even reading the clock.
+        heap.clear()
+        return None
     if now is None:
-        now = time.time()
-    expired = [k for k, v in timers.items() if v and now >= v]
-    if expired and TRACE_ENABLED:
-        print(f"[TRACE timer] expired -> {expired[-1]}")
-    return expired[-1] if expired else None
+        now = time.monotonic()
+    while heap and heap[0][0] <= now:
+        expiry, _, name = heapq.heappop(heap)
+        if timers.get(name) == expiry:
+            return name
+    return None
+
+def _check_expired_traced(ctx: Dict[str, Any], now: float | None = None) -> str | None:
+    name = _check_expired(ctx, now)
+    if name is not None:
+        print(f"[TRACE timer] expired -> {name}")
+    return name
+
+# Tracing is decided once per process; bind the traced or plain variants at
+# import so the hot timer path carries no per-call TRACE_ENABLED branch.
+if TRACE_ENABLED:
+    set_timer = _set_timer_traced
+    clear_timer = _clear_timer_traced
+    check_expired = _check_expired_traced
+else:
+    set_timer = _set_timer
+    clear_timer = _clear_timer
+    check_expired = _check_expired
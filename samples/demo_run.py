@@ -1,13 +1,24 @@
 from __future__ import annotations
+import asyncio
 import sys
 import time
 from typing import Any, Dict
 
-from rich import print as rprint
-
+from config import cfg_path
 from orchestrator.graph import app
 from orchestrator.state import OrchestratorState
 
+# Bind the printer once: rich parses markup and locks the console on every
+# call, which is pure overhead for quiet or non-interactive runs.
+_LOG_LEVEL = str(cfg_path("logging", "level", default="INFO")).upper()
+if _LOG_LEVEL not in ("DEBUG", "INFO"):
+    def rprint(*args: Any, **kwargs: Any) -> None:
+        return None
+elif sys.stdout.isatty():
+    from rich import print as rprint
+else:
+    rprint = print
+
 SCENARIOS = {
     "happy": [
         ("START", {"channel": "voice", "payload": "tôi muốn phát hành lại thẻ"}),
@@ -55,14 +66,33 @@ SCENARIOS = {
     ],
 }
 
+# Intern state names once so the driver's per-tick comparisons hit the
+# interned-string identity fast path instead of hashing fresh strings, and
+# freeze each script as a tuple: scenarios are constants, not per-run state.
+SCENARIOS = {
+    name: tuple((sys.intern(st), payload) for st, payload in steps)
+    for name, steps in SCENARIOS.items()
+}
+
+TERMINAL_STATES = frozenset(map(sys.intern, ("DONE", "FAILED", "RETRACTED")))
+
 
-def tick(state: OrchestratorState) -> OrchestratorState:
-    return app.invoke(state)
+async def tick(state: OrchestratorState) -> OrchestratorState:
+    # ainvoke runs the (sync) graph nodes off the event loop, so the LLM
+    # round-trip no longer blocks timers or other sessions in this process.
+    # Callers merge the result back into their own dict (st.update) so one
+    # state dict — and the ctx dict inside it — lives for the whole run.
+    # One clock read per tick; every timer op downstream reuses state["now"]
+    # instead of fetching its own (and the stamp no longer goes stale across
+    # ticks, since st.update copies the old value back).
+    state["now"] = time.monotonic()
+    return await app.ainvoke(state)
 
 
-def run_scenario(name: str) -> None:
+async def run_scenario(name: str) -> None:
     scen = SCENARIOS[name]
-    pending = list(scen)
+    total = len(scen)
+    cursor = 0
     st: OrchestratorState = {
         "state": "START",
         "ctx": {
@@ -78,7 +108,7 @@ def run_scenario(name: str) -> None:
         },
         "input": {},
         "session_id": f"sess-{int(time.time())}",
-        "now": time.time(),
+        "now": time.monotonic(),
     }
 
     rprint("[bold green]=== DEMO START ===[/bold green]")
@@ -86,12 +116,14 @@ def run_scenario(name: str) -> None:
     while True:
         # Nếu có input dành cho state hiện tại, bơm NGAY rồi tick
         fed = False
-        while pending and pending[0][0] == st["state"]:
-            st["input"] = pending.pop(0)[1]
-            st = tick(st)   # chạy ngay, không để tick trống
-            rprint(f"[yellow]STATE:[/yellow] {st.get('state')}  [blue]RESP:[/blue] {st.get('response')}")
+        while cursor < total and scen[cursor][0] == st["state"]:
+            st["input"] = scen[cursor][1]
+            cursor += 1
+            st.update(await tick(st))   # chạy ngay, không để tick trống
+            cur = st.get("state")
+            rprint(f"[yellow]STATE:[/yellow] {cur}  [blue]RESP:[/blue] {st.get('response')}")
             fed = True
-            if st.get("state") in ("DONE", "FAILED", "RETRACTED"):
+            if cur in TERMINAL_STATES:
                 rprint("[bold green]=== DEMO END ===[/bold green]")
                 return
 
@@ -102,9 +134,10 @@ def run_scenario(name: str) -> None:
             if not has_system_signal:
                 st["input"] = {}
             # Dù có hay không, đều tick để máy tiêu thụ tín hiệu / xử lý timer
-            st = tick(st)
-            rprint(f"[yellow]STATE:[/yellow] {st.get('state')}  [blue]RESP:[/blue] {st.get('response')}")
-            if st.get("state") in ("DONE", "FAILED", "RETRACTED"):
+            st.update(await tick(st))
+            cur = st.get("state")
+            rprint(f"[yellow]STATE:[/yellow] {cur}  [blue]RESP:[/blue] {st.get('response')}")
+            if cur in TERMINAL_STATES:
                 rprint("[bold green]=== DEMO END ===[/bold green]")
                 return
 
@@ -115,4 +148,4 @@ def run_scenario(name: str) -> None:
 
 if __name__ == "__main__":
     name = "happy"
-    run_scenario(name)
+    asyncio.run(run_scenario(name))
@@ -1,20 +1,16 @@
 from __future__ import annotations
+import sys
 import time
 from orchestrator.graph import app
 from orchestrator.state import OrchestratorState
 
 # This test drives the happy path; it does not mock the HTTP LLM. In CI, you may want to mock it.
 
-def test_happy_path_shape() -> None:
-    st: OrchestratorState = {
-        "state": "START",
-        "ctx": {"id_retry": 0, "otp_fail": 0, "stock_checked": False, "branch_suggested": False, "risk_flag": False, "face_others": 0, "id_others": 0, "otp_others": 0, "pickup_others": 0},
-        "input": {"channel": "voice", "payload": "phát hành lại thẻ"},
-        "session_id": "sess-test",
-        "now": time.time(),
-    }
-
-    mapping = {
+# Built once at import; the loop below mirrors the production driver hot path,
+# so it should not rebuild its lookup tables per call either.
+_MAPPING = {
+    sys.intern(k): sys.intern(v)
+    for k, v in {
         "FACE": "face_ok",
         "ID_SCAN": "id_ok",
         "NFC_READ": "nfc_ok",
@@ -25,21 +21,33 @@ def test_happy_path_shape() -> None:
         "PRINTING": "printed",
         "CARD_PICKUP": "card_taken",
         "DONE": "print_receipt_no",
+    }.items()
+}
+_TERMINAL = frozenset({"DONE", "FAILED", "RETRACTED"})
+_VOICE_REQUEST = {"channel": "voice", "payload": "phát hành lại thẻ"}
+
+
+def test_happy_path_shape() -> None:
+    st: OrchestratorState = {
+        "state": "START",
+        "ctx": {"id_retry": 0, "otp_fail": 0, "stock_checked": False, "branch_suggested": False, "risk_flag": False, "face_others": 0, "id_others": 0, "otp_others": 0, "pickup_others": 0},
+        "input": dict(_VOICE_REQUEST),
+        "session_id": "sess-test",
+        "now": time.monotonic(),
     }
 
     for _ in range(30):
         cur = st["state"]
         if cur == "START":
-            st["input"] = {"channel": "voice", "payload": "phát hành lại thẻ"}
+            st["input"] = dict(_VOICE_REQUEST)
         elif cur == "OTP":
             st["input"] = {"channel": "voice", "payload": "482913"}
-        elif cur in mapping:
-            st["input"] = {"channel": "system", "signal": mapping[cur]}
         else:
-            st["input"] = {}
+            sig = _MAPPING.get(cur)
+            st["input"] = {"channel": "system", "signal": sig} if sig else {}
 
         st = app.invoke(st)
-        if st.get("state") in ("DONE", "FAILED", "RETRACTED"):
+        if st.get("state") in _TERMINAL:
             break
 
     assert st.get("state") == "DONE"